@@ -3,22 +3,265 @@ Amazon Deal Finder - Finds snack deals using Amazon's Product Advertising API
 """
 
 import os
+import functools
+import heapq
 import logging
+import operator
+import random
+import threading
 import time
-from decimal import Decimal
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from typing import List, Dict, Optional
 from amazon_paapi import AmazonApi
+from amazon_paapi.errors import ItemsNotFound, RequestError, TooManyRequests
 from amazon_paapi.sdk.models.condition import Condition
+from urllib3.exceptions import MaxRetryError, TimeoutError as Urllib3TimeoutError
+from disk_cache import cache_get, cache_set, cache_clear
 
 logger = logging.getLogger("GoinUPDeals")
 
+SEARCH_CACHE_PREFIX = "paapi:search:"
+KEYWORD_ROTATION_KEY = "paapi:keyword_rotation"
+GET_ITEMS_MAX_IDS = 10  # PA-API GetItems accepts at most 10 ASINs per request
+
+# Specific snack-related keywords searched by find_best_deals
+SNACK_KEYWORDS = (
+    "snack box",
+    "rice krispies treats",
+    "granola bars",
+    "chips snacks",
+    "cookies snacks",
+    "trail mix"
+)
+
+def _with_chained(error: Exception) -> tuple:
+    """
+    The error followed by the exceptions it was raised from
+    
+    The SDK raises its own errors while handling the HTTP-level ApiException,
+    so the response status and headers are on the chained exception.
+    """
+    return (error, error.__cause__, error.__context__)
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the Retry-After delay (in seconds) attached to an API error, if any"""
+    headers = None
+    for candidate in _with_chained(error):
+        response = getattr(candidate, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(candidate, 'headers', None)
+        if headers:
+            break
+    if not headers:
+        return None
+    
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    
+    # Retry-After may also be an HTTP-date
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def _classify_error(error: Exception) -> str:
+    """Map a PA-API call failure to a TokenBucket status"""
+    if isinstance(error, TooManyRequests):
+        return 'throttled'
+    # RequestError covers every other failed response; only server errors mean
+    # the API is overloaded, while 4xx (bad credentials, bad requests) do not
+    if isinstance(error, RequestError):
+        statuses = [getattr(candidate, 'status', None) for candidate in _with_chained(error)]
+        if any(isinstance(status, int) and 500 <= status < 600 for status in statuses):
+            return 'timeout'
+        return 'error'
+    # urllib3 raises its own timeout errors directly, or wrapped in MaxRetryError
+    if isinstance(error, (Urllib3TimeoutError, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, MaxRetryError) and isinstance(error.reason, Urllib3TimeoutError):
+        return 'timeout'
+    return 'error'
+
+@dataclass(slots=True)
+class Deal:
+    """A discounted Amazon product; converted to a dict at the DB/Bluesky boundary"""
+    asin: str
+    title: str
+    price: float
+    original_price: float
+    discount_percent: int
+    url: str
+    image_url: Optional[str]
+    posted: bool = False
+
+    def to_dict(self) -> Dict:
+        """Return the deal as the dictionary used by the database and posters"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+_by_discount = operator.attrgetter('discount_percent')
+# Ranking key with the ASIN as tie-breaker so the top deals don't depend on search completion order
+_deal_rank = operator.attrgetter('discount_percent', 'asin')
+
+# Attribute paths on PA-API items, resolved by attrgetter instead of hasattr chains
+_get_listings = operator.attrgetter('offers.listings')
+_get_amounts = operator.attrgetter('price.amount', 'saving_basis.amount')
+_get_title = operator.attrgetter('item_info.title.display_value')
+_get_image_url = operator.attrgetter('images.primary.medium.url')
+
+def _optional_attr(getter, item, default=None):
+    """Return getter(item), or default when part of the attribute path is missing"""
+    try:
+        return getter(item)
+    except AttributeError:
+        return default
+
+def _extract_deal(item, min_discount: int, url_template: str) -> Optional[Deal]:
+    """Build a Deal from a PA-API item, or None if it isn't a qualifying discount"""
+    try:
+        # A listing without a saving basis has no original price (not a discount)
+        current_amount, original_amount = _get_amounts(_get_listings(item)[0])
+        # Work in integer cents; the API reports amounts as float dollars
+        current_cents = round(current_amount * 100)
+        original_cents = round(original_amount * 100)
+    except (AttributeError, IndexError, TypeError):
+        return None
+    
+    # Double-check discount percentage (should already be filtered by min_saving_percent)
+    discount = AmazonDealFinder.calculate_discount(current_cents, original_cents)
+    if discount < min_discount:
+        return None
+    
+    asin = getattr(item, 'asin', 'unknown')
+    return Deal(
+        asin=asin,
+        title=_optional_attr(_get_title, item, "Unknown Product"),
+        price=current_cents / 100,
+        original_price=original_cents / 100,
+        discount_percent=discount,
+        url=url_template.format(asin=asin),
+        image_url=_optional_attr(_get_image_url, item)
+    )
+
+@functools.lru_cache(maxsize=8)
+def _url_template(affiliate_tag: Optional[str]) -> str:
+    """Product URL template with the affiliate tag filled in, leaving {asin} to format per item"""
+    return f"https://www.amazon.com/dp/{{asin}}?tag={affiliate_tag}"
+
+def extract_deal(item, affiliate_tag: Optional[str], min_discount: int = 15) -> Optional[Dict]:
+    """
+    Build a deal dictionary from a PA-API item for callers that query the API directly
+    
+    Returns:
+        Deal dictionary with an affiliate URL, or None if the item isn't a qualifying discount
+    """
+    deal = _extract_deal(item, min_discount, _url_template(affiliate_tag))
+    return deal.to_dict() if deal else None
+
+class TokenBucket:
+    """
+    Thread-safe rate limiter whose rate adapts to PA-API feedback (AIMD)
+    
+    The rate grows additively while responses are successful and fast, and is
+    cut multiplicatively on throttling or timeouts. A run of consecutive
+    throttles opens a circuit breaker that pauses all calls for a cooldown.
+    After an idle period up to `capacity` requests may go out back to back.
+    """
+    
+    def __init__(self, rate: float = 0.1, min_rate: float = 0.05, max_rate: float = 1.0,
+                 increase: float = 0.5, decrease_factor: float = 0.5, target_latency: float = 5.0,
+                 breaker_threshold: int = 3, breaker_cooldown: float = 300.0,
+                 capacity: int = 1, jitter: float = 0.1):
+        self.rate = rate  # Requests per second
+        self.capacity = max(1, capacity)  # Burst size
+        self.jitter = jitter  # Extra random wait, as a fraction of the wait
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency  # Seconds
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown  # Seconds
+        self.history = deque(maxlen=50)  # (latency, status) of recent calls
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+        self._open_until = 0.0
+        self._consecutive_throttles = 0
+
+    def acquire(self):
+        """Block until the caller is allowed to make the next request"""
+        # Reserve the next slot under the lock so concurrent callers are spaced out.
+        # _next_time runs ahead of the clock by one interval per request, and a
+        # caller only has to wait once it is more than a full burst ahead.
+        with self._lock:
+            now = time.monotonic()
+            interval = 1.0 / self.rate
+            scheduled = max(now, self._next_time, self._open_until)
+            slot = max(now, self._open_until, scheduled - (self.capacity - 1) * interval)
+            self._next_time = scheduled + interval
+        
+        wait = slot - now
+        if wait > 0:
+            # Jitter keeps waiting callers from all firing at the same instant
+            wait += random.uniform(0, self.jitter * wait)
+            logger.info(f"Throttling: Waiting {wait:.2f} seconds before next request")
+            time.sleep(wait)
+
+    def report(self, status: str, latency: float):
+        """
+        Record the outcome of a request and adapt the rate
+        
+        Args:
+            status: 'ok', 'throttled', 'timeout' or 'error'
+            latency: Request duration in seconds
+        """
+        with self._lock:
+            self.history.append((latency, status))
+            
+            if status == 'ok':
+                self._consecutive_throttles = 0
+                if latency <= self.target_latency:
+                    self.rate = min(self.max_rate, self.rate + self.increase)
+                return
+            
+            if status not in ('throttled', 'timeout'):
+                return
+            
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            logger.info(f"Request rate reduced to {self.rate:.3f} requests/second")
+            
+            if status == 'throttled':
+                self._consecutive_throttles += 1
+                if self._consecutive_throttles >= self.breaker_threshold:
+                    self._consecutive_throttles = 0
+                    self._open_until = time.monotonic() + self.breaker_cooldown
+                    logger.warning(f"Circuit breaker open: pausing requests for {self.breaker_cooldown:.0f} seconds")
+
 class AmazonDealFinder:
     def __init__(self):
         """Initialize Amazon PA-API client"""
         self.client = self._setup_client()
-        self.last_request_time = 0
-        self.min_request_interval = 10.0  # 10 seconds between requests
+        # Read once; the affiliate tag is the same for every deal URL
+        self._tag = os.getenv("ASSOCIATE_TAG")
+        self._url_template = _url_template(self._tag)
+        # Start at the account's configured PA-API TPS; the bucket adapts from there
+        tps = float(os.getenv("PAAPI_TPS", "1.0"))
+        max_tps = float(os.getenv("PAAPI_MAX_TPS", str(tps)))
+        burst = int(os.getenv("PAAPI_BURST", "1"))
+        self.bucket = TokenBucket(rate=tps, min_rate=min(0.05, tps), max_rate=max(tps, max_tps), capacity=burst)
         self.max_retries = 3
+        self.backoff_base = 30.0  # Seconds, doubled on each retry
+        self.backoff_cap = 240.0
+        self.max_workers = 3  # Concurrent keyword searches (PA-API TPS cap)
+        self.search_cache_ttl = 900  # Seconds; roughly how long prices stay fresh
+        self.keywords_per_run = 2  # Keyword searches per run when known ASINs are refreshed
 
     def _setup_client(self) -> Optional[AmazonApi]:
         """Set up Amazon PA-API client with error handling"""
@@ -37,7 +280,10 @@ class AmazonDealFinder:
                 key=os.getenv("AMAZON_ACCESS_KEY"),
                 secret=os.getenv("AMAZON_SECRET_KEY"),
                 tag=os.getenv("ASSOCIATE_TAG"),
-                country=country_code
+                country=country_code,
+                # Pacing is done by self.bucket; the SDK's own throttle would cap
+                # every call at 1/s and isn't safe across worker threads
+                throttling=0
             )
             
         except Exception as e:
@@ -45,64 +291,88 @@ class AmazonDealFinder:
             raise
 
     def _throttled_request(self, func, *args, **kwargs):
-        """Execute a request with throttling to avoid rate limits"""
-        # Calculate time since last request
-        now = time.time()
-        time_since_last = now - self.last_request_time
-        
-        # If we need to wait to meet the minimum interval
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            logger.info(f"Throttling: Waiting {sleep_time:.2f} seconds before next request")
-            time.sleep(sleep_time)
-        
-        # Make the request with retries
+        """Execute a request through the shared rate limiter, with retries on rate limits"""
         retries = 0
         while retries <= self.max_retries:
+            self.bucket.acquire()
+            started = time.monotonic()
             try:
-                self.last_request_time = time.time()
-                return func(*args, **kwargs)
+                result = func(*args, **kwargs)
+                self.bucket.report('ok', time.monotonic() - started)
+                return result
             except Exception as e:
-                if "TooManyRequests" in str(e) or "Too Many Requests" in str(e):
+                latency = time.monotonic() - started
+                status = _classify_error(e)
+                self.bucket.report(status, latency)
+                if status == 'throttled':
                     retries += 1
                     if retries > self.max_retries:
                         logger.error(f"Max retries reached. Last error: {e}")
                         raise
                     
-                    # Exponential backoff: wait longer with each retry
-                    wait_time = 30 * (2 ** retries)  # 60s, 120s, 240s
-                    logger.warning(f"Hit rate limits, retrying in {wait_time} seconds (attempt {retries}/{self.max_retries})")
+                    # Honour Retry-After when the API sends it, otherwise back off
+                    # exponentially with jitter so concurrent workers don't retry in lockstep
+                    wait_time = _retry_after_seconds(e)
+                    if wait_time is None:
+                        wait_time = min(self.backoff_cap, self.backoff_base * (2 ** retries)) + random.uniform(0, 1.0)
+                    logger.warning(f"Hit rate limits, retrying in {wait_time:.1f} seconds (attempt {retries}/{self.max_retries})")
                     time.sleep(wait_time)
-                    self.min_request_interval += 5.0  # Increase interval for future requests
                 else:
                     raise
 
-    def calculate_discount(self, current_price: Decimal, original_price: Decimal) -> int:
-        """Calculate discount percentage"""
-        try:
-            if original_price <= 0 or current_price <= 0:
-                return 0
-            return int((original_price - current_price) / original_price * 100)
-        except Exception as e:
-            logger.warning(f"Error calculating discount: {e}")
+    @staticmethod
+    def calculate_discount(current_cents: int, original_cents: int) -> int:
+        """Calculate discount percentage from prices in cents"""
+        if original_cents <= 0 or current_cents <= 0:
             return 0
+        return (original_cents - current_cents) * 100 // original_cents
 
-    def find_deals_by_keyword(self, keyword, min_discount=20, min_price=5.0):
-        """Find deals for a specific keyword with extended throttling"""
+    def _parse_items(self, items, min_discount: int) -> List[Deal]:
+        """Convert PA-API items into Deals, skipping non-discounted ones"""
         deals = []
         
+        for item in items:
+            try:
+                deal = _extract_deal(item, min_discount, self._url_template)
+                if deal:
+                    deals.append(deal)
+            except Exception as e:
+                logger.warning(f"Error processing item {getattr(item, 'asin', 'unknown')}: {e}")
+                continue
+        
+        return deals
+
+    def find_deals_by_keyword(self, keyword, min_discount=20, min_price=5.0, sort=True) -> List[Deal]:
+        """
+        Find deals for a specific keyword with extended throttling
+        
+        Args:
+            sort: Sort the deals by discount; callers that merge and rank
+                results from several keywords can skip this.
+        """
         try:
             logger.info(f"Searching for '{keyword}' deals")
             
             # Convert min_price from dollars to cents (API expects lowest denomination)
             min_price_cents = int(min_price * 100)
+            item_count = 10  # Maximum items per request
+            
+            # Reuse recent results for identical searches (also across runs)
+            cache_key = f"{SEARCH_CACHE_PREFIX}{(keyword, item_count, min_price_cents, Condition.NEW, min_discount)!r}"
+            cached = cache_get(cache_key, self.search_cache_ttl)
+            if cached is not None:
+                logger.info(f"Using cached results for '{keyword}' ({len(cached)} deals)")
+                deals = [Deal(**deal) for deal in cached]
+                if sort:
+                    deals.sort(key=_by_discount, reverse=True)
+                return deals
             
             # Use only parameters that work with your API version
             # Based on test results: keywords, item_count, min_price, condition, min_saving_percent
             response = self._throttled_request(
                 self.client.search_items,
                 keywords=keyword,
-                item_count=10,  # Maximum items per request
+                item_count=item_count,
                 min_price=min_price_cents,
                 condition=Condition.NEW,
                 min_saving_percent=min_discount  # Use this to filter by discount directly
@@ -110,174 +380,143 @@ class AmazonDealFinder:
             
             if not hasattr(response, 'items') or not response.items:
                 logger.warning(f"No items found for '{keyword}'")
+                cache_set(cache_key, [])
                 return []
             
             logger.info(f"Found {len(response.items)} items for '{keyword}'")
             
-            for item in response.items:
-                try:
-                    # Check if the item has offers and listings
-                    if not hasattr(item, 'offers') or not item.offers or not hasattr(item.offers, 'listings') or not item.offers.listings:
-                        continue
-                        
-                    listing = item.offers.listings[0]
-                    
-                    # Check if price exists
-                    if not hasattr(listing, 'price') or not hasattr(listing.price, 'amount'):
-                        continue
-                        
-                    current_price = Decimal(str(listing.price.amount))
-                    
-                    # Check if saving_basis exists for original price
-                    original_price = None
-                    if hasattr(listing, 'saving_basis') and hasattr(listing.saving_basis, 'amount'):
-                        original_price = Decimal(str(listing.saving_basis.amount))
-                    else:
-                        # Skip if no original price (not a discount)
-                        continue
-                    
-                    # Double-check discount percentage (should already be filtered by min_saving_percent)
-                    discount = self.calculate_discount(current_price, original_price)
-                    
-                    if discount >= min_discount:
-                        # Check for item_info and title
-                        title = "Unknown Product"
-                        if hasattr(item, 'item_info') and hasattr(item.item_info, 'title') and hasattr(item.item_info.title, 'display_value'):
-                            title = item.item_info.title.display_value
-                            
-                        # Check for ASIN
-                        asin = getattr(item, 'asin', 'unknown')
-                        
-                        # Check for image URL
-                        image_url = None
-                        if hasattr(item, 'images') and hasattr(item.images, 'primary') and hasattr(item.images.primary, 'medium'):
-                            image_url = getattr(item.images.primary.medium, 'url', None)
-                        
-                        deals.append({
-                            'asin': asin,
-                            'title': title,
-                            'price': float(current_price),
-                            'original_price': float(original_price),
-                            'discount_percent': discount,
-                            'url': f"https://www.amazon.com/dp/{asin}?tag={os.getenv('ASSOCIATE_TAG')}",
-                            'image_url': image_url,
-                            'posted': False
-                        })
-                except Exception as e:
-                    logger.warning(f"Error processing item {getattr(item, 'asin', 'unknown')}: {e}")
-                    continue
-                    
+            deals = self._parse_items(response.items, min_discount)
+            
+            cache_set(cache_key, [deal.to_dict() for deal in deals])
+            
             # Sort by discount percentage
-            deals.sort(key=lambda x: x['discount_percent'], reverse=True)
+            if sort:
+                deals.sort(key=_by_discount, reverse=True)
             return deals
             
         except Exception as e:
             logger.error(f"Error searching for {keyword}: {e}")
             return []
 
-    def find_best_deals(self, num_deals: int = 5, min_discount: int = 20, min_price: float = 5.0) -> List[Dict]:
-        """Find the best snack deals on Amazon"""
+    def refresh_known_deals(self, asins: List[str], min_discount: int = 1,
+                            min_price: float = 0.0) -> Optional[List[Deal]]:
+        """
+        Re-check pricing for previously found ASINs with a single batched GetItems call
+        
+        Stored deals may have been saved with a lower threshold than any one
+        caller's (deal_fetcher keeps 15% discounts), so by default every item
+        that is still discounted at all is kept.
+        
+        Returns:
+            The ASINs that still qualify as deals, with current prices, or None if
+            the request failed and nothing is known about them
+        """
+        asins = list(asins)[:GET_ITEMS_MAX_IDS]
+        if not asins:
+            return []
+        
+        try:
+            logger.info(f"Refreshing {len(asins)} known deals")
+            items = self._throttled_request(
+                self.client.get_items,
+                items=asins,
+                condition=Condition.NEW
+            )
+        except ItemsNotFound:
+            logger.info("None of the known deals are available any more")
+            return []
+        except Exception as e:
+            logger.error(f"Error refreshing known deals: {e}")
+            return None
+        
+        deals = self._parse_items(items or [], min_discount)
+        return [deal for deal in deals if deal.price >= min_price]
+
+    def _rotate_keywords(self, keywords: List[str]) -> List[str]:
+        """Pick the next keywords_per_run keywords, continuing where the last run stopped"""
+        offset = cache_get(KEYWORD_ROTATION_KEY, float('inf')) or 0
+        count = min(self.keywords_per_run, len(keywords))
+        cache_set(KEYWORD_ROTATION_KEY, (offset + count) % len(keywords))
+        return [keywords[(offset + i) % len(keywords)] for i in range(count)]
+
+    def find_best_deals(self, num_deals: int = 5, min_discount: int = 20, min_price: float = 5.0,
+                        known_asins: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Find the best snack deals on Amazon
+        
+        Args:
+            num_deals: Number of deals to return
+            min_discount: Minimum discount percentage
+            min_price: Minimum price in dollars
+            known_asins: ASINs already stored by earlier runs. They are left out
+                of the results (refresh them with refresh_known_deals), and only
+                a rotating subset of keywords is searched, saving API quota.
+        """
         if not self.client:
             logger.error("Amazon client not initialized")
             return []
 
-        # Use specific snack-related keywords
-        keywords = [
-            "snack box", 
-            "rice krispies treats", 
-            "granola bars",
-            "chips snacks",
-            "cookies snacks",
-            "trail mix"
-        ]
-        deals = []
+        keywords = list(SNACK_KEYWORDS)
+        skip_asins = frozenset(known_asins or ())
+        # Keyword results overlap heavily, so keep one deal per ASIN
+        deals: Dict[str, Deal] = {}
         
-        for keyword in keywords:
-            try:
-                logger.info(f"Searching for '{keyword}'")
-                
-                # Convert min_price from dollars to cents (API expects lowest denomination)
-                min_price_cents = int(min_price * 100)
-                
-                # Use only parameters that work with your API version
-                response = self._throttled_request(
-                    self.client.search_items,
-                    keywords=keyword,
-                    item_count=10,
-                    min_price=min_price_cents,
-                    condition=Condition.NEW,
-                    min_saving_percent=min_discount
-                )
-                
-                if not hasattr(response, 'items') or not response.items:
-                    logger.warning(f"No items found for '{keyword}'")
+        def add_deals(new_deals: List[Deal]):
+            for deal in new_deals:
+                if deal.asin in skip_asins:
                     continue
-                
-                logger.info(f"Found {len(response.items)} items for '{keyword}'")
-                
-                for item in response.items:
-                    try:
-                        # Check if the item has offers and listings
-                        if not hasattr(item, 'offers') or not item.offers or not hasattr(item.offers, 'listings') or not item.offers.listings:
-                            continue
-                            
-                        listing = item.offers.listings[0]
-                        
-                        # Check if price exists
-                        if not hasattr(listing, 'price') or not hasattr(listing.price, 'amount'):
-                            continue
-                            
-                        current_price = Decimal(str(listing.price.amount))
-                        
-                        # Check if saving_basis exists for original price
-                        original_price = None
-                        if hasattr(listing, 'saving_basis') and hasattr(listing.saving_basis, 'amount'):
-                            original_price = Decimal(str(listing.saving_basis.amount))
-                        else:
-                            # Skip if no original price (not a discount)
-                            continue
-                        
-                        # Double-check discount percentage
-                        discount = self.calculate_discount(current_price, original_price)
-                        
-                        if discount >= min_discount:
-                            # Check for item_info and title
-                            title = "Unknown Product"
-                            if hasattr(item, 'item_info') and hasattr(item.item_info, 'title') and hasattr(item.item_info.title, 'display_value'):
-                                title = item.item_info.title.display_value
-                                
-                            # Check for ASIN
-                            asin = getattr(item, 'asin', 'unknown')
-                            
-                            # Check for image URL
-                            image_url = None
-                            if hasattr(item, 'images') and hasattr(item.images, 'primary') and hasattr(item.images.primary, 'medium'):
-                                image_url = getattr(item.images.primary.medium, 'url', None)
-                            
-                            deals.append({
-                                'asin': asin,
-                                'title': title,
-                                'price': float(current_price),
-                                'original_price': float(original_price),
-                                'discount_percent': discount,
-                                'url': f"https://www.amazon.com/dp/{asin}?tag={os.getenv('ASSOCIATE_TAG')}",
-                                'image_url': image_url,
-                                'posted': False
-                            })
-                    except Exception as e:
-                        logger.warning(f"Error processing item {getattr(item, 'asin', 'unknown')}: {e}")
-                        continue
-                        
-            except Exception as e:
-                logger.error(f"Error searching for {keyword}: {e}")
-                continue
+                existing = deals.get(deal.asin)
+                if existing is None or deal.discount_percent > existing.discount_percent:
+                    deals[deal.asin] = deal
         
-        # Sort by discount percentage and return top deals
-        deals.sort(key=lambda x: x['discount_percent'], reverse=True)
-        return deals[:num_deals]
+        if known_asins:
+            keywords = self._rotate_keywords(keywords)
+        
+        # Searches are I/O-bound, so run them concurrently; _throttled_request
+        # keeps the combined request rate under the PA-API limit
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.find_deals_by_keyword, keyword, min_discount, min_price, sort=False): keyword
+                for keyword in keywords
+            }
+            for future in as_completed(futures):
+                try:
+                    add_deals(future.result())
+                except Exception as e:
+                    logger.error(f"Error searching for {futures[future]}: {e}")
+        
+        # Return the top deals by discount percentage
+        return [deal.to_dict() for deal in heapq.nlargest(num_deals, deals.values(), key=_deal_rank)]
+
+_finder: Optional[AmazonDealFinder] = None
+_finder_lock = threading.Lock()
+
+def get_finder() -> AmazonDealFinder:
+    """
+    Return the process-wide AmazonDealFinder.
+    
+    Sharing one finder means every caller draws from the same TokenBucket, so
+    back-to-back calls stay under the PA-API rate limit and the learned rate
+    carries over between scheduled runs.
+    """
+    global _finder
+    with _finder_lock:
+        if _finder is None:
+            _finder = AmazonDealFinder()
+        return _finder
 
 # Function to get the best deals (to be used directly without class)
-def find_best_deals(num_deals: int = 5, min_discount: int = 20, min_price: float = 5.0) -> List[Dict]:
+def find_best_deals(num_deals: int = 5, min_discount: int = 20, min_price: float = 5.0,
+                    known_asins: Optional[List[str]] = None) -> List[Dict]:
     """Find the best snack deals on Amazon"""
-    finder = AmazonDealFinder()
-    return finder.find_best_deals(num_deals, min_discount, min_price)
\ No newline at end of file
+    return get_finder().find_best_deals(num_deals, min_discount, min_price, known_asins)
+
+def refresh_known_deals(asins: List[str], min_discount: int = 1,
+                        min_price: float = 0.0) -> Optional[List[Dict]]:
+    """Re-check stored deals; None if the lookup failed (see AmazonDealFinder.refresh_known_deals)"""
+    deals = get_finder().refresh_known_deals(asins, min_discount, min_price)
+    return None if deals is None else [deal.to_dict() for deal in deals]
+
+def clear_search_cache() -> int:
+    """Drop all cached PA-API search results, forcing fresh requests"""
+    return cache_clear(SEARCH_CACHE_PREFIX)
\ No newline at end of file
@@ -8,7 +8,10 @@ import os
 import logging
 import sys
 import argparse
+import asyncio
+import signal
 import time
+from typing import Dict, List
 from dotenv import load_dotenv
 
 # Setup logging
@@ -23,14 +26,17 @@ logging.basicConfig(
 
 logger = logging.getLogger("GoinUPDeals")
 
+POST_INTERVAL_SECONDS = 14400  # Time between posts
+FIND_INTERVAL_SECONDS = 3600  # Time between deal searches in scheduled mode
+
 # Load environment variables
 load_dotenv()
 
 # Import necessary modules
 from database_operations import DealsDatabase
-from amazon_deal_finder import find_best_deals
+from amazon_deal_finder import find_best_deals, refresh_known_deals, clear_search_cache
 # IMPORTANT: Import the updated function post_deal_with_embed.
-from bluesky_poster import setup_bluesky_api, test_bluesky_connection, post_deal_with_embed
+from bluesky_poster import setup_bluesky_api, test_bluesky_connection, post_deal_with_embed, post_deals_backlog
 
 def bluesky_post_from_database(db: DealsDatabase) -> bool:
     """
@@ -63,7 +69,7 @@ def bluesky_post_from_database(db: DealsDatabase) -> bool:
             return False
 
         # Post to Bluesky using the rich posting function.
-        if post_deal_with_embed(client, deal):
+        if post_deal_with_embed(client, deal, db):
             # Mark the deal as posted in the database.
             db.mark_deal_as_posted(deal['asin'])
             logger.info(f"Posted deal from database to Bluesky: {deal['title']}")
@@ -76,6 +82,104 @@ def bluesky_post_from_database(db: DealsDatabase) -> bool:
         logger.error(f"Error posting deal from database to Bluesky: {e}")
         return False
 
+def bluesky_post_backlog(db: DealsDatabase, count: int) -> int:
+    """
+    Post up to `count` of the best unposted deals at once, e.g. after downtime.
+    
+    Returns:
+        Number of deals posted successfully.
+    """
+    client = setup_bluesky_api()
+    if not client:
+        logger.error("Bluesky API setup failed")
+        return 0
+    
+    deals = db.get_best_unposted_deals(count)
+    if not deals:
+        logger.info("No unposted deals found in database")
+        return 0
+    
+    posted = 0
+    for deal, success in zip(deals, post_deals_backlog(client, deals, db)):
+        if success:
+            db.mark_deal_as_posted(deal['asin'])
+            posted += 1
+        else:
+            logger.error(f"Failed to post deal to Bluesky: {deal['title']}")
+    return posted
+
+def refresh_and_find_deals(db: DealsDatabase, num_deals: int = 5) -> List[Dict]:
+    """
+    Refresh the prices of stored unposted deals, then search for new ones.
+    
+    Stored deals that are no longer discounted at all, or no longer
+    available, are removed. The returned deals are all ASINs that aren't
+    in the database yet.
+    """
+    known_asins = db.get_known_asins()
+    refreshed = refresh_known_deals(known_asins)
+    if refreshed is not None:
+        db.update_deal_prices(refreshed)
+        still_deals = {deal['asin'] for deal in refreshed}
+        db.delete_unposted_deals([asin for asin in known_asins if asin not in still_deals])
+    return find_best_deals(num_deals=num_deals, known_asins=known_asins)
+
+def find_and_save_deals(db: DealsDatabase, num_deals: int = 5) -> int:
+    """
+    Search Amazon for deals and store new ones in the database.
+    
+    Returns:
+        Number of new deals saved.
+    """
+    deals = refresh_and_find_deals(db, num_deals)
+    saved = db.save_deals_bulk(deals)
+    logger.info(f"Deal finder saved {saved} new deals ({len(deals)} found)")
+    return saved
+
+async def _run_periodically(name: str, interval: float, job, stop: asyncio.Event):
+    """
+    Run a blocking job in a worker thread now and then every `interval` seconds.
+    
+    Runs are scheduled against time.monotonic() so the job's own duration
+    doesn't push later runs back; setting `stop` ends the loop immediately.
+    """
+    next_run = time.monotonic()
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(job)
+        except Exception as e:
+            logger.error(f"Error in {name}: {e}")
+        
+        next_run += interval
+        logger.info(f"Next {name} run in {interval / 3600:g} hours")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=max(0, next_run - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+
+async def run_scheduled(db: DealsDatabase):
+    """
+    Run the deal finder and the poster as independent background tasks.
+    
+    The finder keeps the database stocked every FIND_INTERVAL_SECONDS while
+    the poster publishes the best unposted deal every POST_INTERVAL_SECONDS,
+    so a slow Amazon search never delays a post. SIGINT/SIGTERM stop both.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Not supported on Windows; Ctrl+C still cancels asyncio.run()
+            pass
+    
+    await asyncio.gather(
+        _run_periodically("deal finder", FIND_INTERVAL_SECONDS, lambda: find_and_save_deals(db), stop),
+        _run_periodically("poster", POST_INTERVAL_SECONDS, lambda: bluesky_post_from_database(db), stop),
+    )
+    logger.info("Scheduled mode stopped")
+
 def main():
     """Main function to run the Goin UP Deals Bluesky bot."""
     parser = argparse.ArgumentParser(description='Goin UP Deals Bluesky Bot')
@@ -83,9 +187,15 @@ def main():
     parser.add_argument('--setup', action='store_true', help='Set up the database and exit')
     parser.add_argument('--find', action='store_true', help='Find deals without posting and print them')
     parser.add_argument('--manual', action='store_true', help='Manually post a single deal from the database')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached Amazon search results')
+    parser.add_argument('--backlog', type=int, metavar='N', help='Post up to N unposted deals from the database at once')
     
     args = parser.parse_args()
     
+    if args.refresh:
+        cleared = clear_search_cache()
+        logger.info(f"Cleared {cleared} cached search results")
+    
     try:
         # Initialize the database service
         db = DealsDatabase()  # Raises error if credentials are missing
@@ -96,7 +206,7 @@ def main():
         
         elif args.find:
             logger.info("Finding deals without posting...")
-            deals = find_best_deals(num_deals=5)
+            deals = refresh_and_find_deals(db, num_deals=5)
             if deals:
                 logger.info(f"Found {len(deals)} deals:")
                 for i, deal in enumerate(deals, 1):
@@ -110,9 +220,18 @@ def main():
             if not test_bluesky_connection():
                 logger.error("Bluesky connection test failed")
                 return
-            logger.info("Running in test mode - running bluesky_post_test.py")
-            import subprocess
-            subprocess.run([sys.executable, "bluesky_post_test.py"])
+            logger.info("Running in test mode - running bluesky_post_test")
+            from bluesky_post_test import main as run_test
+            run_test(client=setup_bluesky_api(), db=db)
+            return
+            
+        elif args.backlog:
+            if not test_bluesky_connection():
+                logger.error("Bluesky connection test failed")
+                return
+            logger.info(f"Posting up to {args.backlog} deals from the database")
+            posted = bluesky_post_backlog(db, args.backlog)
+            print(f"Posted {posted} deal(s) to Bluesky")
             return
             
         elif args.manual:
@@ -134,15 +253,7 @@ def main():
             logger.info("Starting Goin UP Deals Bluesky Bot in scheduled mode")
             print("Press Ctrl+C to exit")
             
-            # Immediately post one deal.
-            bluesky_post_from_database(db)
-            
-            # Then schedule future posts using a simple loop.
-            while True:
-                # Wait 6 hours between posts (14400 seconds).
-                logger.info("Waiting 6 hours until next post...")
-                time.sleep(14400)
-                bluesky_post_from_database(db)
+            asyncio.run(run_scheduled(db))
 
     except Exception as e:
         logger.exception(f"Unhandled exception: {e}")
@@ -4,17 +4,53 @@ Bluesky Post - Alternate module for posting deals to Bluesky with rich text form
 This version uses facets to create a clickable "View Deal" link and an embed for images.
 """
 
+import io
 import os
 import logging
 import random
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from atproto import Client
 from dotenv import load_dotenv
+from disk_cache import cache_get, cache_set, cache_delete
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; images are uploaded unmodified without it
+    Image = None
 
 logger = logging.getLogger("GoinUPDeals")
 load_dotenv()
 
+# Shared session so image downloads reuse pooled keep-alive connections
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503])
+))
+
+IMAGE_CACHE_PREFIX = "bsky:image:"
+IMAGE_CACHE_TTL = 7 * 24 * 3600  # Seconds
+MAX_IMAGE_BYTES = 1_000_000  # Bluesky rejects image blobs above ~1MB
+DOWNSCALE_THRESHOLD_BYTES = 500_000
+
+# Post template, split around the link label so the label's offset is known
+# without searching the text (which could also match inside the title)
+LINK_LABEL = "View Deal"
+_POST_HEAD_TEMPLATE = (
+    "🔥 PRICES GOIN UP SOON! 🔥\n\n"
+    "**{title}**\n\n"
+    "Now: {price} (was {original})\n"
+    "{discount}% OFF!\n\n"
+    "Grab it while it's hot! "
+)
+_POST_TAIL = LINK_LABEL + "\n\n#GoinUPDeals #AmazonDeals #DealAlert"
+_LINK_LABEL_BYTES = len(LINK_LABEL.encode("utf-8"))
+MAX_POST_LENGTH = 300  # Bluesky's limit, counted in graphemes
+
 def setup_bluesky_api() -> Optional[Client]:
     try:
         bluesky_username = os.getenv("BLUESKY_USERNAME")
@@ -30,23 +66,115 @@ def setup_bluesky_api() -> Optional[Client]:
         logger.error(f"Bluesky API authentication failed: {e}")
         return None
 
-def create_link_facet(text: str, link_label: str, url: str) -> dict:
-    try:
-        start = text.index(link_label)
-        end = start + len(link_label)
-    except ValueError:
-        start = 0
-        end = 0
+def create_link_facet(byte_start: int, byte_end: int, url: str) -> dict:
     return {
         "$type": "app.bsky.richtext.facet",
-        "index": {"byteStart": start, "byteEnd": end},
+        "index": {"byteStart": byte_start, "byteEnd": byte_end},
         "features": [{
-            "$type": "app.bsky.richtext.facet.view",
+            "$type": "app.bsky.richtext.facet#link",
             "uri": url
         }]
     }
 
-def format_deal_post_rich(deal: Dict, client: Client) -> dict:
+def _blob_to_json(blob: Any) -> Any:
+    """Convert an uploaded blob reference into plain JSON so it can be cached"""
+    if hasattr(blob, 'model_dump'):
+        return blob.model_dump(mode='json', by_alias=True)
+    return blob
+
+def _download_image(image_url: str) -> Optional[Tuple[bytes, Optional[str]]]:
+    """
+    Stream an image, giving up if it is larger than MAX_IMAGE_BYTES.
+    
+    Returns:
+        Tuple of (image bytes, ETag header), or None if the download failed
+    """
+    resp = _session.get(image_url, stream=True, timeout=10)
+    with resp:
+        if resp.status_code != 200:
+            return None
+        
+        content_length = resp.headers.get('Content-Length')
+        if content_length and int(content_length) > MAX_IMAGE_BYTES:
+            logger.warning(f"Image too large ({content_length} bytes), skipping: {image_url}")
+            return None
+        
+        data = bytearray()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            data.extend(chunk)
+            if len(data) > MAX_IMAGE_BYTES:
+                logger.warning(f"Image exceeded {MAX_IMAGE_BYTES} bytes, skipping: {image_url}")
+                return None
+        
+        return bytes(data), resp.headers.get('ETag')
+
+def _downscale_image(image_data: bytes) -> bytes:
+    """Re-encode large images as smaller JPEGs when Pillow is available"""
+    if Image is None or len(image_data) <= DOWNSCALE_THRESHOLD_BYTES:
+        return image_data
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            img = img.convert("RGB")
+            img.thumbnail((1000, 1000))
+            output = io.BytesIO()
+            img.save(output, format="JPEG", quality=85, optimize=True)
+        smaller = output.getvalue()
+        return smaller if len(smaller) < len(image_data) else image_data
+    except Exception as e:
+        logger.warning(f"Failed to downscale image: {e}")
+        return image_data
+
+def upload_image(client: Client, image_url: str) -> Tuple[Optional[Any], Optional[dict]]:
+    """
+    Upload a deal image to Bluesky and return its blob reference.
+    
+    Uploads are cached by image URL together with the image's ETag; when a
+    HEAD request shows the ETag is unchanged, the cached blob is reused and
+    both the download and the upload are skipped.
+    
+    Returns:
+        Tuple of (blob reference or None, cache entry). Blobs no post refers to
+        are garbage-collected by the server, so the entry is only written once
+        a post using it succeeds; see _settle_image_cache.
+    """
+    cache_key = f"{IMAGE_CACHE_PREFIX}{image_url}"
+    cached = cache_get(cache_key, IMAGE_CACHE_TTL)
+    if cached:
+        etag, blob = cached
+        try:
+            head = _session.head(image_url, timeout=10, allow_redirects=True)
+        except requests.RequestException as e:
+            # Can't confirm the cached blob is current; fetch the image instead
+            logger.warning(f"Image HEAD request failed, downloading instead: {e}")
+        else:
+            if head.status_code == 200 and head.headers.get('ETag') == etag:
+                logger.info("Reusing previously uploaded image")
+                return blob, {"key": cache_key, "cached": True}
+    
+    downloaded = _download_image(image_url)
+    if downloaded is None:
+        return None, None
+    image_data, etag = downloaded
+    
+    upload_response = client.upload_blob(_downscale_image(image_data), "image/jpeg")
+    if not upload_response or not hasattr(upload_response, 'blob'):
+        return None, None
+    
+    blob = _blob_to_json(upload_response.blob)
+    entry = {"key": cache_key, "cached": False, "value": (etag, blob)} if etag else None
+    return blob, entry
+
+def _settle_image_cache(entry: Optional[dict], success: bool) -> None:
+    """Cache a new upload once a post uses it; drop a cached blob whose post failed"""
+    if not entry:
+        return
+    if success and not entry["cached"]:
+        cache_set(entry["key"], entry["value"])
+    elif not success and entry["cached"]:
+        cache_delete(entry["key"])
+
+def _format_post(deal: Dict, client: Client) -> Tuple[dict, Optional[dict]]:
+    """Build the post record, returning it with the image's pending cache entry"""
     title = deal['title']
     if len(title) > 50:
         title = title[:47] + "..."
@@ -54,28 +182,28 @@ def format_deal_post_rich(deal: Dict, client: Client) -> dict:
     original = f"${deal['original_price']:.2f}"
     discount = deal['discount_percent']
     url = deal['url']
-    text = (
-        "🔥 PRICES GOIN UP SOON! 🔥\n\n"
-        f"**{title}**\n\n"
-        f"Now: {price} (was {original})\n"
-        f"{discount}% OFF!\n\n"
-        "Grab it while it's hot! View Deal\n\n"
-        "#GoinUPDeals #AmazonDeals #DealAlert"
-    )
-    facets = [create_link_facet(text, "View Deal", url)]
+    head = _POST_HEAD_TEMPLATE.format(title=title, price=price, original=original, discount=discount)
+    # Shorten the title rather than cutting the end of the post, which would
+    # drop the link label and leave the facet pointing past the text
+    overflow = len(head) + len(_POST_TAIL) - MAX_POST_LENGTH
+    if overflow > 0:
+        title = title[:max(len(title) - overflow - 3, 0)] + "..."
+        head = _POST_HEAD_TEMPLATE.format(title=title, price=price, original=original, discount=discount)
+    text = head + _POST_TAIL
+    # Facet indices are UTF-8 byte offsets, not character offsets
+    link_start = len(head.encode("utf-8"))
+    facets = [create_link_facet(link_start, link_start + _LINK_LABEL_BYTES, url)]
     embed = None
+    image_cache = None
     image_url = deal.get('image_url')
     if image_url:
         try:
-            resp = requests.get(image_url)
-            if resp.status_code == 200:
-                image_data = resp.content
-                upload_response = client.upload_blob(image_data, "image/jpeg")
-                if upload_response and hasattr(upload_response, 'blob'):
-                    embed = {
-                        "$type": "app.bsky.embed.images",
-                        "images": [{"image": {"ref": upload_response.blob}}]
-                    }
+            blob, image_cache = upload_image(client, image_url)
+            if blob:
+                embed = {
+                    "$type": "app.bsky.embed.images",
+                    "images": [{"image": {"ref": blob}}]
+                }
         except Exception as e:
             logger.warning(f"Failed to process image embed: {e}")
     record = {
@@ -84,22 +212,26 @@ def format_deal_post_rich(deal: Dict, client: Client) -> dict:
     }
     if embed:
         record["embed"] = embed
-    max_length = 300
-    if len(record["text"]) > max_length:
-        record["text"] = record["text"][:max_length-3] + "..."
-    return record
+    return record, image_cache
+
+def format_deal_post_rich(deal: Dict, client: Client) -> dict:
+    return _format_post(deal, client)[0]
 
 def post_deal_with_embed(client: Client, deal: Dict) -> bool:
+    image_cache = None
     try:
-        record = format_deal_post_rich(deal, client)
+        record, image_cache = _format_post(deal, client)
         response = client.createRecord("app.bsky.feed.post", record=record)
-        if response and hasattr(response, 'uri'):
+        success = bool(response and hasattr(response, 'uri'))
+        _settle_image_cache(image_cache, success)
+        if success:
             logger.info(f"Successfully posted deal: {deal['title']}")
             return True
         else:
             logger.error(f"Failed to post deal, response: {response}")
             return False
     except Exception as e:
+        _settle_image_cache(image_cache, False)
         logger.error(f"Error posting deal with embed: {e}")
         return False
 
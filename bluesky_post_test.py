@@ -25,24 +25,28 @@ logger = logging.getLogger("GoinUPDeals")
 # Load environment variables
 load_dotenv()
 
-# Import the database module
-try:
-    from database_operations import DealsDatabase
-    db = DealsDatabase()
-    logger.info("Database connection established")
-except Exception as e:
-    logger.error(f"Database connection failed: {e}")
-    db = None
+ASSOCIATE_TAG = os.getenv('ASSOCIATE_TAG', '')
+
+def connect_database():
+    '''Connect to the deals database, returning None if it is unavailable'''
+    try:
+        from database_operations import DealsDatabase
+        db = DealsDatabase()
+        logger.info("Database connection established")
+        return db
+    except Exception as e:
+        logger.error(f"Database connection failed: {e}")
+        return None
 
 def find_single_deal():
     '''Find a single good deal using the parameters that work with your API'''
-    from amazon_deal_finder import AmazonDealFinder
+    from amazon_deal_finder import get_finder, extract_deal
     
     try:
         logger.info("Looking for a good deal...")
         
-        # Create AmazonDealFinder instance
-        finder = AmazonDealFinder()
+        # Use the process-wide AmazonDealFinder
+        finder = get_finder()
         
         # Set up specific keywords for snacks
         keywords = [
@@ -74,49 +78,7 @@ def find_single_deal():
                 
                 logger.info(f"Found {len(response.items)} items for '{keyword}'")
                 
-                deals = []
-                for item in response.items:
-                    try:
-                        if not hasattr(item, 'offers') or not item.offers or not hasattr(item.offers, 'listings') or not item.offers.listings:
-                            continue
-                            
-                        listing = item.offers.listings[0]
-                        
-                        if not hasattr(listing, 'price') or not hasattr(listing.price, 'amount'):
-                            continue
-                        
-                        current_price = float(listing.price.amount)
-                        
-                        if not hasattr(listing, 'saving_basis') or not hasattr(listing.saving_basis, 'amount'):
-                            continue
-                        
-                        original_price = float(listing.saving_basis.amount)
-                        discount = int((original_price - current_price) / original_price * 100)
-                        
-                        if discount >= 15:
-                            title = "Unknown Product"
-                            if hasattr(item, 'item_info') and hasattr(item.item_info, 'title') and hasattr(item.item_info.title, 'display_value'):
-                                title = item.item_info.title.display_value
-                            
-                            asin = getattr(item, 'asin', 'unknown')
-                            
-                            image_url = None
-                            if hasattr(item, 'images') and hasattr(item.images, 'primary') and hasattr(item.images.primary, 'medium'):
-                                image_url = getattr(item.images.primary.medium, 'url', None)
-                            
-                            deals.append({
-                                'asin': asin,
-                                'title': title,
-                                'price': current_price,
-                                'original_price': original_price,
-                                'discount_percent': discount,
-                                'url': f"https://www.amazon.com/dp/{asin}?tag={os.getenv('ASSOCIATE_TAG')}",
-                                'image_url': image_url,
-                                'posted': False
-                            })
-                    except Exception as e:
-                        logger.warning(f"Error processing item {getattr(item, 'asin', 'unknown')}: {e}")
-                        continue
+                deals = [deal for deal in (extract_deal(item, ASSOCIATE_TAG) for item in response.items) if deal]
                 
                 if deals:
                     deals.sort(key=lambda x: x['discount_percent'], reverse=True)
@@ -133,8 +95,8 @@ def find_single_deal():
         logger.error(f"Error finding deal: {e}")
         return None
 
-def post_single_deal(deal):
-    '''Post a single deal to Bluesky'''
+def post_single_deal(deal, client=None, db=None):
+    '''Post a single deal to Bluesky, reusing the given client if provided'''
     try:
         # IMPORTANT: Update the import here to use post_deal_with_embed.
         from bluesky_poster import setup_bluesky_api, post_deal_with_embed
@@ -143,14 +105,15 @@ def post_single_deal(deal):
             logger.error("No deal to post")
             return False
         
-        logger.info("Setting up Bluesky API...")
-        client = setup_bluesky_api()
+        if client is None:
+            logger.info("Setting up Bluesky API...")
+            client = setup_bluesky_api()
         if not client:
             logger.error("Bluesky API setup failed")
             return False
         
         logger.info(f"Posting deal to Bluesky: {deal['title']}")
-        success = post_deal_with_embed(client, deal)
+        success = post_deal_with_embed(client, deal, db)
         if success:
             logger.info("Deal posted successfully to Bluesky!")
             if db:
@@ -165,7 +128,7 @@ def post_single_deal(deal):
         logger.error(f"Error posting deal to Bluesky: {e}")
         return False
 
-def run_single_post_test():
+def run_single_post_test(client=None, db=None):
     '''Run a complete test of finding and posting a single deal'''
     logger.info("====== FINDING A DEAL ======")
     deal = find_single_deal()
@@ -182,7 +145,7 @@ def run_single_post_test():
     
     confirm = input("\nPost this deal to Bluesky? (y/n): ")
     if confirm.lower() == 'y':
-        if post_single_deal(deal):
+        if post_single_deal(deal, client, db):
             logger.info("Test completed successfully!")
             return True
         else:
@@ -192,7 +155,17 @@ def run_single_post_test():
         logger.info("Post cancelled by user")
         return False
 
-if __name__ == "__main__":
+def main(client=None, db=None):
+    '''
+    Run the interactive single post test.
+    
+    Args:
+        client: Authenticated Bluesky client to reuse (logs in if omitted)
+        db: DealsDatabase used to record the posted deal (optional)
+    
+    Returns:
+        True if a deal was posted successfully
+    '''
     print("=== Goin UP Deals - Bluesky Post Test ===\n")
     print("This script will:")
     print("1. Find a single good deal")
@@ -202,11 +175,15 @@ if __name__ == "__main__":
     
     input("Press Enter to begin or Ctrl+C to cancel...")
     
-    success = run_single_post_test()
+    success = run_single_post_test(client, db)
     
     if success:
         print("\n✅ Test completed successfully!")
     else:
         print("\n❌ Test failed. Check the logs for details.")
-        
-    sys.exit(0 if success else 1)
+    
+    return success
+
+if __name__ == "__main__":
+    success = main(db=connect_database())
+    sys.exit(0 if success else 1)
\ No newline at end of file
@@ -10,64 +10,238 @@ Refer to: https://docs.bsky.app/docs/advanced-guides/post-richtext
 """
 
 import os
+import asyncio
+import hashlib
 import logging
 import random
-from typing import Dict, Optional, List
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, List, Tuple
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from atproto import Client
+from atproto_client.exceptions import BadRequestError
+from atproto_client.models.blob_ref import BlobRef
 from dotenv import load_dotenv
+from database_operations import DealsDatabase
 
 logger = logging.getLogger("GoinUPDeals")
 load_dotenv()
 
-def setup_bluesky_api() -> Optional[Client]:
-    """Initialize and return Bluesky API client."""
+SESSION_PATH = os.getenv(
+    "BLUESKY_SESSION_PATH",
+    os.path.expanduser("~/.cache/goinupdeals/bsky.session")
+)
+
+MAX_IMAGE_BYTES = 1_000_000  # Bluesky rejects image blobs above ~1MB
+MAX_TITLE_BYTES = 100
+MAX_POST_LENGTH = 300  # Bluesky's limit, counted in graphemes
+
+# Post text is head + URL + tail, so the URL's offset is known without searching
+_POST_HEAD_TEMPLATE = (
+    "🔥 PRICES GOIN UP SOON! 🔥\n\n"
+    "**{title}**\n\n"
+    "Now: {price} (was {original})\n"
+    "{discount}% OFF!\n\n"
+    "Grab it while it's hot! "
+)
+_POST_TAIL = "\n\n#GoinUPDeals #AmazonDeals #DealAlert"
+
+# Authenticated client shared by every caller in this process
+_client: Optional[Client] = None
+
+# Shared session so image downloads reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.3)
+))
+IMAGE_TIMEOUT = (3, 10)  # (connect, read) seconds
+
+def _load_session() -> Optional[str]:
+    """Read the saved Bluesky session string, if any."""
     try:
+        with open(SESSION_PATH, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read saved Bluesky session: {e}")
+        return None
+
+def _save_session(session_string: str) -> None:
+    """Persist the Bluesky session string, readable only by the current user."""
+    try:
+        os.makedirs(os.path.dirname(SESSION_PATH), exist_ok=True)
+        fd = os.open(SESSION_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(session_string)
+    except Exception as e:
+        logger.warning(f"Could not save Bluesky session: {e}")
+
+def _on_session_change(event, session) -> None:
+    """Keep the saved session current when the client refreshes its tokens."""
+    _save_session(session.export())
+
+def setup_bluesky_api(force_login: bool = False) -> Optional[Client]:
+    """
+    Initialize and return Bluesky API client.
+    
+    The client is created once per process. Its session is saved to disk
+    and reused on later runs, so the username/password login only happens
+    when there is no valid saved session.
+    
+    Args:
+        force_login: Discard any existing client and log in again.
+    """
+    global _client
+    if _client is not None and not force_login:
+        return _client
+    
+    try:
+        client = Client()
+        client.on_session_change(_on_session_change)
+        
+        session_string = None if force_login else _load_session()
+        if session_string:
+            try:
+                client.login(session_string=session_string)
+                logger.info("Bluesky API authentication successful (saved session)")
+                _client = client
+                return client
+            except Exception as e:
+                logger.warning(f"Saved Bluesky session rejected, logging in again: {e}")
+        
         bluesky_username = os.getenv("BLUESKY_USERNAME")
         bluesky_password = os.getenv("BLUESKY_APP_PASSWORD")
         if not bluesky_username or not bluesky_password:
             logger.error("Bluesky credentials not found in environment variables")
             return None
-        client = Client()
         client.login(bluesky_username, bluesky_password)
+        _save_session(client.export_session_string())
         logger.info("Bluesky API authentication successful")
+        _client = client
         return client
     except Exception as e:
         logger.error(f"Bluesky API authentication failed: {e}")
         return None
 
-def create_link_facet(text: str, url: str) -> List[dict]:
+def create_link_facet(byte_start: int, byte_end: int, url: str) -> dict:
     """
-    Create a facet for a URL in text.
-    This will make the URL clickable in the post.
+    Create a facet that makes a span of the post text a clickable link.
     
     Args:
-        text: The post text
-        url: The URL to make clickable
+        byte_start: UTF-8 byte offset where the link text starts
+        byte_end: UTF-8 byte offset just past the link text
+        url: The link target
         
     Returns:
-        List of facet dictionaries
+        Facet dictionary
     """
-    # Find where the URL appears in the text
-    try:
-        start = text.index(url)
-        end = start + len(url)
-        
-        return [{
-            "index": {
-                "byteStart": start,
-                "byteEnd": end
-            },
-            "features": [{
-                "$type": "app.bsky.richtext.facet#link",
-                "uri": url
-            }]
+    return {
+        "index": {
+            "byteStart": byte_start,
+            "byteEnd": byte_end
+        },
+        "features": [{
+            "$type": "app.bsky.richtext.facet#link",
+            "uri": url
         }]
-    except ValueError:
-        logger.warning(f"URL {url} not found in post text, facet will not be created")
-        return []
+    }
+
+def _download_image(image_url: str, etag: Optional[str] = None) -> Optional[Tuple[Optional[bytes], Optional[str]]]:
+    """
+    Stream an image, giving up if it is larger than MAX_IMAGE_BYTES.
+    
+    Args:
+        image_url: Image to download.
+        etag: ETag of a previously downloaded copy; sent as If-None-Match.
+        
+    Returns:
+        Tuple of (image bytes, ETag header), with bytes None when the server
+        reports the image unchanged (304), or None if the download failed.
+    """
+    headers = {"If-None-Match": etag} if etag else None
+    with _SESSION.get(image_url, headers=headers, stream=True, timeout=IMAGE_TIMEOUT) as resp:
+        if resp.status_code == 304:
+            return None, etag
+        if resp.status_code != 200:
+            return None
+        data = bytearray()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            data.extend(chunk)
+            if len(data) > MAX_IMAGE_BYTES:
+                logger.warning(f"Image exceeded {MAX_IMAGE_BYTES} bytes, skipping: {image_url}")
+                return None
+        return bytes(data), resp.headers.get('ETag')
 
-def format_deal_post_rich(deal: Dict, client: Client) -> dict:
+def upload_image(client: Client, image_url: str,
+                 db: Optional[DealsDatabase] = None) -> Tuple[Optional[Any], Optional[dict]]:
+    """
+    Upload a deal image and return its blob reference.
+    
+    When a database is given, blob references are cached in its blob_cache
+    table keyed by the SHA-256 of the image URL, so an image that was already
+    uploaded is not uploaded again. Entries that recorded an ETag are
+    revalidated with a conditional GET, which skips the body on a 304.
+    
+    Returns:
+        Tuple of (blob reference or None, blob_cache entry). The entry is only
+        written once a post using the blob succeeds, because the server
+        garbage-collects blobs that no record references; see _settle_image_cache.
+    """
+    url_hash = hashlib.sha256(image_url.encode('utf-8')).hexdigest()
+    cached = db.get_cached_blob(url_hash) if db else None
+    if cached and not cached.get('etag'):
+        logger.info("Reusing previously uploaded image")
+        return BlobRef.model_validate(cached['blob_json']), {"url_hash": url_hash, "cached": True}
+    
+    downloaded = _download_image(image_url, cached['etag'] if cached else None)
+    if downloaded is None:
+        return None, None
+    image_data, etag = downloaded
+    if image_data is None:
+        logger.info("Image unchanged, reusing previously uploaded image")
+        return BlobRef.model_validate(cached['blob_json']), {"url_hash": url_hash, "cached": True}
+    
+    upload_response = client.upload_blob(image_data)
+    if not upload_response or not hasattr(upload_response, 'blob'):
+        return None, None
+    entry = {
+        "url_hash": url_hash,
+        "cached": False,
+        "blob_json": _to_json(upload_response.blob),
+        "etag": etag
+    }
+    return upload_response.blob, entry
+
+def _settle_image_cache(db: Optional[DealsDatabase], post_data: dict, success: bool) -> None:
+    """
+    Update the blob cache once the outcome of a post is known.
+    
+    A new upload is cached only after a post references it. A cached blob is
+    evicted when its post fails, in case the server has already dropped it, so
+    the next attempt uploads the image again.
+    """
+    entry = post_data.get("image_cache")
+    if not db or not entry:
+        return
+    if success and not entry["cached"]:
+        db.cache_blob(entry["url_hash"], entry["blob_json"], entry["etag"])
+    elif not success and entry["cached"]:
+        db.evict_cached_blob(entry["url_hash"])
+
+def _truncate_bytes(s: str, max_bytes: int) -> str:
+    """Shorten s to at most max_bytes of UTF-8, ending with "..." if cut."""
+    encoded = s.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return s
+    # Dropping a partial trailing character keeps the result valid UTF-8
+    return encoded[:max_bytes - 3].decode('utf-8', errors='ignore') + "..."
+
+def format_deal_post_rich(deal: Dict, client: Client, db: Optional[DealsDatabase] = None) -> dict:
     """
     Build a rich post record with facets and, if available, an embed for an image.
     
@@ -75,63 +249,72 @@ def format_deal_post_rich(deal: Dict, client: Client) -> dict:
         deal: Dictionary with keys such as 'title', 'price', 'original_price',
               'discount_percent', 'url', and optionally 'image_url'.
         client: Bluesky API client used for uploading the image.
+        db: Optional database used to cache uploaded images.
         
     Returns:
         A dictionary representing the post record.
     """
-    title = deal['title']
-    if len(title) > 50:
-        title = title[:47] + "..."
+    title = _truncate_bytes(deal['title'], MAX_TITLE_BYTES)
     
     price = f"${deal['price']:.2f}"
     original = f"${deal['original_price']:.2f}"
     discount = deal['discount_percent']
     url = deal['url']
     
-    # Base text including the full URL (for facet to work)
-    text = (
-        "🔥 PRICES GOIN UP SOON! 🔥\n\n"
-        f"**{title}**\n\n"
-        f"Now: {price} (was {original})\n"
-        f"{discount}% OFF!\n\n"
-        f"Grab it while it's hot! {url}\n\n"
-        "#GoinUPDeals #AmazonDeals #DealAlert"
-    )
+    # Shorten the title to whatever the rest of the post leaves of the limit.
+    # Code points never undercount graphemes, so len() is a safe measure.
+    rest = len(_POST_HEAD_TEMPLATE.format(title="", price=price, original=original, discount=discount))
+    title_budget = MAX_POST_LENGTH - rest - len(url) - len(_POST_TAIL)
+    if len(title) > title_budget:
+        title = title[:max(title_budget - 3, 0)] + "..."
+    
+    # Facet offsets count UTF-8 bytes, not characters
+    head = _POST_HEAD_TEMPLATE.format(title=title, price=price, original=original, discount=discount)
+    text = head + url + _POST_TAIL
     
     # Create facets for the URL
-    facets = create_link_facet(text, url)
+    url_start = len(head.encode('utf-8'))
+    facets = [create_link_facet(url_start, url_start + len(url.encode('utf-8')), url)]
     
     # Handle image embeds
     embed = None
+    image_cache = None
     image_url = deal.get('image_url')
     if image_url:
         try:
-            resp = requests.get(image_url)
-            if resp.status_code == 200:
-                image_data = resp.content
-                # Upload the image blob
-                upload_response = client.upload_blob(image_data)
-                if upload_response and hasattr(upload_response, 'blob'):
-                    # Create image embed
-                    embed = {
-                        "$type": "app.bsky.embed.images",
-                        "images": [{"alt": title, "image": upload_response.blob}]
-                    }
+            blob, image_cache = upload_image(client, image_url, db)
+            if blob:
+                # Create image embed
+                embed = {
+                    "$type": "app.bsky.embed.images",
+                    "images": [{"alt": title, "image": blob}]
+                }
         except Exception as e:
             logger.warning(f"Failed to process image embed: {e}")
     
     return {
         "text": text,
         "facets": facets,
-        "embed": embed
+        "embed": embed,
+        "image_cache": image_cache
     }
 
-def post_deal_with_embed(client: Client, deal: Dict) -> bool:
+def _is_expired_token(error: Exception) -> bool:
+    """True if the server rejected the session's tokens as expired."""
+    if not isinstance(error, BadRequestError) or error.response is None:
+        return False
+    return getattr(error.response.content, 'error', None) == 'ExpiredToken'
+
+def post_deal_with_embed(client: Client, deal: Dict, db: Optional[DealsDatabase] = None,
+                         retry_on_expired: bool = True) -> bool:
     """
     Post a deal to Bluesky using rich text formatting, facets, and embed.
+    
+    If the saved session has expired, logs in again and retries once.
     """
+    post_data = {}
     try:
-        post_data = format_deal_post_rich(deal, client)
+        post_data = format_deal_post_rich(deal, client, db)
         
         # Using send_post method which is more commonly available in the AT Protocol client
         response = client.send_post(
@@ -140,16 +323,120 @@ def post_deal_with_embed(client: Client, deal: Dict) -> bool:
             embed=post_data.get("embed")
         )
         
-        if response and hasattr(response, 'uri'):
+        success = bool(response and hasattr(response, 'uri'))
+        _settle_image_cache(db, post_data, success)
+        if success:
             logger.info(f"Successfully posted deal: {deal['title']}")
             return True
         else:
             logger.error(f"Failed to post deal, response: {response}")
             return False
     except Exception as e:
+        _settle_image_cache(db, post_data, False)
+        if retry_on_expired and _is_expired_token(e):
+            logger.warning("Bluesky session expired, logging in again")
+            client = setup_bluesky_api(force_login=True)
+            if client:
+                return post_deal_with_embed(client, deal, db, retry_on_expired=False)
         logger.error(f"Error posting deal with embed: {e}")
         return False
 
+def _to_json(value: Any) -> Any:
+    """Convert SDK models (e.g. uploaded blob refs) inside a record to plain JSON."""
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(mode='json', by_alias=True, exclude_none=True)
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    return value
+
+def _build_post_record(post_data: dict) -> dict:
+    """Turn the output of format_deal_post_rich into an app.bsky.feed.post record."""
+    record = {
+        "$type": "app.bsky.feed.post",
+        "text": post_data["text"],
+        "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    }
+    if post_data.get("facets"):
+        record["facets"] = post_data["facets"]
+    if post_data.get("embed"):
+        record["embed"] = _to_json(post_data["embed"])
+    return record
+
+def _session_credentials(client: Client) -> Tuple[str, str, str]:
+    """
+    Return (did, access JWT, PDS URL) for raw XRPC calls.
+    
+    Session strings are exported as handle:::did:::accessJwt:::refreshJwt[:::pds].
+    """
+    parts = client.export_session_string().split(":::")
+    did, access_jwt = parts[1], parts[2]
+    pds = parts[4] if len(parts) > 4 and parts[4] else "https://bsky.social"
+    return did, access_jwt, pds.rstrip("/")
+
+async def post_record(session: httpx.AsyncClient, record: dict, did: str, access_jwt: str) -> bool:
+    """Create a post record with a direct com.atproto.repo.createRecord call."""
+    try:
+        response = await session.post(
+            "/xrpc/com.atproto.repo.createRecord",
+            json={"repo": did, "collection": "app.bsky.feed.post", "record": record},
+            headers={"Authorization": f"Bearer {access_jwt}"}
+        )
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        logger.error(f"Error creating post record: {e}")
+        return False
+
+async def _post_records(records: List[dict], did: str, access_jwt: str, pds: str) -> List[bool]:
+    """Send all records concurrently over one HTTP connection pool."""
+    async with httpx.AsyncClient(base_url=pds, timeout=30) as session:
+        return await asyncio.gather(*(post_record(session, record, did, access_jwt) for record in records))
+
+def post_deals_backlog(client: Client, deals: List[Dict], db: Optional[DealsDatabase] = None) -> List[bool]:
+    """
+    Post several queued deals at once.
+    
+    Images are uploaded and records built with the SDK, then all createRecord
+    calls are sent concurrently, so draining a backlog takes roughly one
+    round-trip instead of one per deal. Single posts should keep using
+    post_deal_with_embed.
+    
+    Returns:
+        A success flag for each deal, in order.
+    """
+    records = []
+    post_datas = []
+    for deal in deals:
+        post_data = {}
+        try:
+            post_data = format_deal_post_rich(deal, client, db)
+            records.append(_build_post_record(post_data))
+        except Exception as e:
+            logger.error(f"Error preparing deal {deal.get('asin')}: {e}")
+            records.append(None)
+        post_datas.append(post_data)
+    
+    pending = [record for record in records if record is not None]
+    if not pending:
+        return [False] * len(deals)
+    
+    try:
+        # Any SDK call refreshes an expired access token before we export it
+        client.com.atproto.server.get_session()
+        did, access_jwt, pds = _session_credentials(client)
+        results = iter(asyncio.run(_post_records(pending, did, access_jwt, pds)))
+    except Exception as e:
+        logger.error(f"Error posting deal backlog: {e}")
+        results = iter([False] * len(pending))
+    
+    outcomes = [next(results) if record is not None else False for record in records]
+    for post_data, success in zip(post_datas, outcomes):
+        _settle_image_cache(db, post_data, success)
+    logger.info(f"Posted {sum(outcomes)} of {len(deals)} backlog deals")
+    return outcomes
+
 def test_bluesky_connection() -> bool:
     """Test Bluesky API connection."""
     try:
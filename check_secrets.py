@@ -4,9 +4,17 @@ Check for potential secrets or sensitive information in project files.
 Run this before pushing code to a public repository.
 """
 
+import bisect
+import mmap
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import hyperscan
+except ImportError:  # Optional; without it every compiled pattern is run on each file
+    hyperscan = None
 
 # Patterns to look for
 SECRET_PATTERNS = [
@@ -37,61 +45,185 @@ SECRET_PATTERNS = [
     r'bluesky_app_password["\']?\s*[:=]\s*["\']?[^\s\'\"]{8,}["\']?'
 ]
 
+# Compiled once at import. Files are scanned whole, so "\s*" is narrowed to
+# exclude newlines and matches stay within a single line as before.
+_COMPILED_PATTERNS = [
+    re.compile(pattern.replace(r'\s*', r'[^\S\n]*'), re.IGNORECASE)
+    for pattern in SECRET_PATTERNS
+]
+
+# Lines whose matches are ignored: comments and environment variable lookups
+_SKIP_LINE = re.compile(r'^\s*(?:#|//)|os\.getenv\(["\']|load_dotenv')
+
+# Byte-string versions for scanning memory-mapped ASCII files without decoding
+_BYTES_PATTERNS = [
+    re.compile(pattern.pattern.encode('ascii'), re.IGNORECASE)
+    for pattern in _COMPILED_PATTERNS
+]
+
+_NEWLINE = re.compile(r'\n')
+_NEWLINE_BYTES = re.compile(rb'\n')
+# Non-ASCII bytes, or carriage returns that text mode would turn into newlines
+_NEEDS_DECODING = re.compile(rb'[^\x00-\x0c\x0e-\x7f]')
+
+def _build_hyperscan_database():
+    """Compile all patterns into one Hyperscan database, or None if unavailable."""
+    if hyperscan is None:
+        return None
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[pattern.pattern.encode('utf-8') for pattern in _COMPILED_PATTERNS],
+            ids=list(range(len(_COMPILED_PATTERNS))),
+            elements=len(_COMPILED_PATTERNS),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH
+                   | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP] * len(_COMPILED_PATTERNS)
+        )
+        return database
+    except Exception as e:
+        print(f"Hyperscan unavailable, using re only: {e}", file=sys.stderr)
+        return None
+
+_HS_DATABASE = _build_hyperscan_database()
+
+def _candidate_patterns(content):
+    """
+    Return the indexes of patterns that can match content.
+    
+    With Hyperscan, all patterns are checked in a single pass and only the
+    ones that hit are re-run with re to recover the exact matches; without
+    it every pattern is a candidate. Decoded text (files with non-ASCII
+    content) always gets every pattern, because Hyperscan's case folding
+    doesn't match re's Unicode rules there.
+    """
+    if _HS_DATABASE is None or isinstance(content, str):
+        return range(len(_COMPILED_PATTERNS))
+    
+    matched = set()
+    
+    def on_match(pattern_id, start, end, flags, context):
+        matched.add(pattern_id)
+    
+    _HS_DATABASE.scan(content, match_event_handler=on_match)
+    return sorted(matched)
+
+def _find_secrets(content, patterns, newline, to_text):
+    """
+    Scan str or bytes-like content with the matching set of compiled patterns.
+    
+    to_text converts slices of content to str for reporting and line skipping.
+    """
+    # Offsets where each line starts, for mapping matches to line numbers;
+    # only built once something matches, since most files have no hits
+    line_starts = None
+    
+    hits = []
+    for pattern_index in _candidate_patterns(content):
+        for match in patterns[pattern_index].finditer(content):
+            if line_starts is None:
+                line_starts = [0] + [m.end() for m in newline.finditer(content)]
+            line_index = bisect.bisect_right(line_starts, match.start()) - 1
+            line_start = line_starts[line_index]
+            line_end = line_starts[line_index + 1] - 1 if line_index + 1 < len(line_starts) else len(content)
+            
+            if _SKIP_LINE.search(to_text(content[line_start:line_end])):
+                continue
+            
+            hits.append((line_index + 1, pattern_index, match.start(), to_text(match.group(0))))
+    
+    # Report in line order, then pattern order, as a line-by-line scan would
+    hits.sort()
+    return [(line_number, text) for line_number, _, _, text in hits]
+
+def _decode_ascii(data):
+    return data.decode('ascii')
+
 def check_file(file_path):
     """Check a single file for potential secrets."""
+    # Skip README and similar files
+    if file_path.endswith(('README.md', '.gitignore', 'LICENSE')):
+        return []
+    
     try:
+        # Plain ASCII files are scanned in place through a read-only memory map
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if not _NEEDS_DECODING.search(mm):
+                    return _find_secrets(mm, _BYTES_PATTERNS, _NEWLINE_BYTES, _decode_ascii)
+        
+        # Other files are decoded so patterns keep their Unicode meaning;
+        # files that aren't valid UTF-8 are reported as unreadable
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
-        
-        issues = []
-        line_number = 0
-        
-        for line_number, line in enumerate(content.split('\n'), 1):
-            for pattern in SECRET_PATTERNS:
-                matches = re.finditer(pattern, line, re.IGNORECASE)
-                for match in matches:
-                    # Skip matches in comments
-                    if line.strip().startswith('#') or line.strip().startswith('//'):
-                        continue
-                    
-                    # Skip matches that are likely variable assignments
-                    if re.search(r'os\.getenv\(["\']', line) or "load_dotenv" in line:
-                        continue
-                    
-                    # Skip README and similar files
-                    if file_path.endswith(('README.md', '.gitignore', 'LICENSE')):
-                        continue
-                    
-                    issues.append((line_number, match.group(0)))
-        
-        return issues
+        return _find_secrets(content, _COMPILED_PATTERNS, _NEWLINE, str)
     except Exception as e:
         return [(0, f"Error reading file: {e}")]
 
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_MIN_FILES = 64
+
+# Directories that are never scanned, along with everything below them
+_SKIP_DIRS = {'.git', '__pycache__', 'venv', '.venv', 'node_modules', '.mypy_cache'}
+
+_EXTS = frozenset(['.py', '.js', '.json', '.yml', '.yaml', '.env', '.ini', '.cfg', '.txt', '.md'])
+
+# Larger files are data or binaries, not hand-written config worth scanning
+MAX_FILE_BYTES = 5_000_000
+
+def _collect_files(directory, paths=None):
+    """
+    List files to scan, in os.walk order.
+    
+    Skipped directories are pruned instead of walked, and the stat results
+    from os.scandir are reused for the size check.
+    """
+    if paths is None:
+        paths = []
+    subdirs = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                # Like os.walk, don't follow symlinked directories
+                if entry.name not in _SKIP_DIRS and not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
+            # Skip the check_secrets.py script itself
+            if entry.name == 'check_secrets.py':
+                continue
+            # Dotfiles such as .env have no extension, so match on the whole name
+            if (os.path.splitext(entry.name)[1] or entry.name).lower() not in _EXTS:
+                continue
+            try:
+                if entry.stat().st_size > MAX_FILE_BYTES:
+                    continue
+            except OSError:
+                continue
+            paths.append(entry.path)
+    for subdir in subdirs:
+        _collect_files(subdir, paths)
+    return paths
+
 def scan_directory(directory):
     """Scan a directory for potential secrets in all files."""
-    file_extensions = ['.py', '.js', '.json', '.yml', '.yaml', '.env', '.ini', '.cfg', '.txt', '.md']
     issues_found = False
     
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if any(file.endswith(ext) for ext in file_extensions):
-                file_path = os.path.join(root, file)
-                
-                # Skip the check_secrets.py script itself
-                if os.path.basename(file_path) == 'check_secrets.py':
-                    continue
-                
-                # Skip files in .git, __pycache__, etc.
-                if '/.git/' in file_path or '/__pycache__/' in file_path or '/venv/' in file_path:
-                    continue
-                
-                issues = check_file(file_path)
-                if issues:
-                    print(f"\n⚠️  Potential secrets found in {file_path}:")
-                    for line_num, issue in issues:
-                        print(f"  Line {line_num}: {issue}")
-                    issues_found = True
+    paths = _collect_files(directory)
+    
+    # Scanning is CPU-bound and independent per file, so spread large trees across cores
+    if len(paths) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(check_file, paths, chunksize=32))
+    else:
+        results = [check_file(path) for path in paths]
+    
+    for file_path, issues in zip(paths, results):
+        if issues:
+            print(f"\n⚠️  Potential secrets found in {file_path}:")
+            for line_num, issue in issues:
+                print(f"  Line {line_num}: {issue}")
+            issues_found = True
     
     return issues_found
 
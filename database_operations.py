@@ -5,13 +5,17 @@ Handles all database interactions including storing and retrieving deals
 
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
 logger = logging.getLogger("SnackDeals")
 
+def _utc_now_iso() -> str:
+    """Current UTC time as an ISO 8601 string"""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
 class DealsDatabase:
     def __init__(self):
         """Initialize Supabase client"""
@@ -25,6 +29,25 @@ class DealsDatabase:
             raise ValueError("Supabase credentials not found in environment variables")
         return create_client(self.supabase_url, self.supabase_key)
 
+    def _deal_details(self, deal_data: Dict) -> Dict:
+        """Extract the fetched-from-Amazon columns of a deals-table row"""
+        return {
+            'asin': deal_data.get('asin', ''),
+            'title': deal_data.get('title', ''),
+            'price': float(deal_data.get('price', 0)),
+            'original_price': float(deal_data.get('original_price', 0)),
+            'discount_percent': int(deal_data.get('discount_percent', 0)),
+            'url': deal_data.get('url', ''),
+            'image_url': deal_data.get('image_url')
+        }
+
+    def _normalize(self, deal_data: Dict, created_at: str) -> Dict:
+        """Build a deals-table row from deal data, filling in every required field"""
+        row = self._deal_details(deal_data)
+        row['posted'] = False
+        row['created_at'] = created_at
+        return row
+
     def save_deal(self, deal_data: Dict) -> bool:
         """
         Save a new deal to the database
@@ -34,17 +57,7 @@ class DealsDatabase:
         """
         try:
             # Ensure all required fields exist (even if NULL)
-            deal_fields = {
-                'asin': deal_data.get('asin', ''),
-                'title': deal_data.get('title', ''),
-                'price': float(deal_data.get('price', 0)),
-                'original_price': float(deal_data.get('original_price', 0)),
-                'discount_percent': int(deal_data.get('discount_percent', 0)),
-                'url': deal_data.get('url', ''),
-                'image_url': deal_data.get('image_url'),
-                'posted': False,
-                'created_at': datetime.utcnow().isoformat()
-            }
+            deal_fields = self._normalize(deal_data, _utc_now_iso())
 
             # Check if deal already exists
             existing = self.client.table('deals').select('id').eq('asin', deal_fields['asin']).execute()
@@ -62,26 +75,130 @@ class DealsDatabase:
             logger.error(f"Error saving deal: {e}")
             return False
 
+    def save_deals_bulk(self, deals: List[Dict]) -> int:
+        """
+        Save many deals in a single request, skipping ASINs already stored
+        
+        Relies on the UNIQUE constraint on deals.asin.
+        
+        Args:
+            deals: List of dictionaries containing deal information
+            
+        Returns:
+            Number of new deals inserted
+        """
+        if not deals:
+            return 0
+        try:
+            # One timestamp for the whole batch
+            now_iso = _utc_now_iso()
+            # One row per ASIN; later duplicates in the batch are dropped
+            rows = {}
+            for deal in deals:
+                row = self._normalize(deal, now_iso)
+                rows.setdefault(row['asin'], row)
+
+            response = self.client.table('deals')\
+                .upsert(list(rows.values()), on_conflict='asin', ignore_duplicates=True)\
+                .execute()
+
+            saved = len(response.data or [])
+            logger.info(f"Saved {saved} new deals ({len(rows)} submitted)")
+            return saved
+
+        except Exception as e:
+            logger.error(f"Error saving deals: {e}")
+            return 0
+
+    def update_deal_prices(self, deals: List[Dict]) -> int:
+        """
+        Overwrite the stored details of existing deals with freshly fetched ones
+        
+        Posted state and created_at are left untouched.
+        
+        Returns:
+            Number of deals updated
+        """
+        if not deals:
+            return 0
+        try:
+            rows = [self._deal_details(deal) for deal in deals]
+            response = self.client.table('deals')\
+                .upsert(rows, on_conflict='asin')\
+                .execute()
+            updated = len(response.data or [])
+            logger.info(f"Updated prices for {updated} deals")
+            return updated
+        except Exception as e:
+            logger.error(f"Error updating deal prices: {e}")
+            return 0
+
+    def delete_unposted_deals(self, asins: List[str]) -> int:
+        """Remove unposted deals, e.g. ones that are no longer discounted"""
+        if not asins:
+            return 0
+        try:
+            response = self.client.table('deals')\
+                .delete()\
+                .in_('asin', list(asins))\
+                .eq('posted', False)\
+                .execute()
+            deleted = len(response.data or [])
+            logger.info(f"Removed {deleted} deals that no longer qualify")
+            return deleted
+        except Exception as e:
+            logger.error(f"Error removing deals: {e}")
+            return 0
+
     def get_posted_deals(self, days: int = 7) -> List[str]:
         """Get ASINs of deals posted in the last X days"""
         try:
+            # A concrete timestamp lets Postgres use the (posted, created_at) index
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec='seconds')
             response = self.client.table('deals')\
                 .select('asin')\
                 .eq('posted', True)\
-                .gte('created_at', f'now()-interval \'{days} days\'')\
+                .gte('created_at', cutoff)\
                 .execute()
             return [record['asin'] for record in response.data]
         except Exception as e:
             logger.error(f"Error getting posted deals: {e}")
             return []
 
+    def get_recent_asins(self, days: int = 30) -> frozenset:
+        """Get ASINs of all deals stored in the last X days, for filtering new batches"""
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec='seconds')
+            response = self.client.table('deals')\
+                .select('asin')\
+                .gte('created_at', cutoff)\
+                .execute()
+            return frozenset(record['asin'] for record in response.data)
+        except Exception as e:
+            logger.error(f"Error getting recent ASINs: {e}")
+            return frozenset()
+
+    def get_known_asins(self, limit: int = 10) -> List[str]:
+        """Get ASINs of the best unposted deals found by earlier searches"""
+        try:
+            response = self.client.table('deals')\
+                .select('asin')\
+                .eq('posted', False)\
+                .order('discount_percent', desc=True)\
+                .limit(limit)\
+                .execute()
+            return [record['asin'] for record in response.data]
+        except Exception as e:
+            logger.error(f"Error getting known ASINs: {e}")
+            return []
+
     def mark_deal_as_posted(self, asin: str) -> bool:
         """Mark a deal as posted"""
         try:
             self.client.table('deals')\
                 .update({
                     'posted': True,
-                    'posted_at': datetime.utcnow().isoformat()
+                    'posted_at': _utc_now_iso()
                 })\
                 .eq('asin', asin)\
                 .execute()
@@ -103,4 +220,59 @@ class DealsDatabase:
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error getting best unposted deal: {e}")
-            return None 
\ No newline at end of file
+            return None 
+
+    def get_best_unposted_deals(self, limit: int) -> List[Dict]:
+        """Get the best unposted deals, highest discount first"""
+        try:
+            response = self.client.table('deals')\
+                .select('*')\
+                .eq('posted', False)\
+                .order('discount_percent', desc=True)\
+                .limit(limit)\
+                .execute()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Error getting best unposted deals: {e}")
+            return []
+
+    def get_cached_blob(self, url_hash: str) -> Optional[Dict]:
+        """Get the stored Bluesky blob reference and image ETag for an image URL hash"""
+        try:
+            response = self.client.table('blob_cache')\
+                .select('blob_json, etag')\
+                .eq('url_hash', url_hash)\
+                .limit(1)\
+                .execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error reading blob cache: {e}")
+            return None
+
+    def cache_blob(self, url_hash: str, blob_json: Dict, etag: Optional[str] = None) -> bool:
+        """Store the Bluesky blob reference uploaded for an image URL hash"""
+        try:
+            self.client.table('blob_cache')\
+                .upsert({
+                    'url_hash': url_hash,
+                    'blob_json': blob_json,
+                    'etag': etag,
+                    'created_at': _utc_now_iso()
+                }, on_conflict='url_hash')\
+                .execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error writing blob cache: {e}")
+            return False
+
+    def evict_cached_blob(self, url_hash: str) -> bool:
+        """Forget the stored blob reference for an image URL hash"""
+        try:
+            self.client.table('blob_cache')\
+                .delete()\
+                .eq('url_hash', url_hash)\
+                .execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error evicting blob cache entry: {e}")
+            return False
\ No newline at end of file
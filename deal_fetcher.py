@@ -5,9 +5,9 @@ and stores them in the database for later posting
 """
 
 import os
+import asyncio
 import logging
 import sys
-import time
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -26,20 +26,62 @@ logger = logging.getLogger("GoinUPDeals")
 # Load environment variables
 load_dotenv()
 
+ASSOCIATE_TAG = os.getenv('ASSOCIATE_TAG', '')
+
 # Import modules
 from database_operations import DealsDatabase
-from amazon_deal_finder import AmazonDealFinder
+from amazon_deal_finder import get_finder, extract_deal
 from amazon_paapi.sdk.models.condition import Condition
 
-def fetch_daily_deals():
+MAX_SEARCH_WORKERS = 3  # Keyword searches allowed in flight at once
+
+def _search_one(finder, keyword):
+    """Search a single keyword and return the qualifying deals"""
+    logger.info(f"Searching for '{keyword}'")
+    
+    # Convert min_price from dollars to cents (API expects lowest denomination)
+    min_price_cents = int(5.0 * 100)  # $5 minimum price
+    
+    # Use only parameters that work with your API version
+    # Get deals for this keyword using the parameters we know work
+    # Use the AmazonDealFinder instance directly instead of the find_deals_by_keyword method
+    response = finder._throttled_request(
+        finder.client.search_items,
+        keywords=keyword,
+        item_count=10,
+        min_price=min_price_cents,
+        condition=Condition.NEW,
+        min_saving_percent=15  # 15% minimum discount
+    )
+    
+    if not hasattr(response, 'items') or not response.items:
+        logger.warning(f"No items found for '{keyword}'")
+        return []
+    
+    logger.info(f"Found {len(response.items)} items for '{keyword}'")
+    
+    deals = [deal for deal in (extract_deal(item, ASSOCIATE_TAG) for item in response.items) if deal]
+    
+    return deals
+
+async def _search_keyword(finder, keyword, sem):
+    """Run one blocking keyword search in a worker thread, limited by sem"""
+    async with sem:
+        try:
+            return await asyncio.to_thread(_search_one, finder, keyword)
+        except Exception as e:
+            logger.error(f"Error searching for '{keyword}': {e}")
+            return []
+
+async def fetch_daily_deals_async():
     """Fetch deals from Amazon and store them in the database"""
     try:
         # Connect to database
         db = DealsDatabase()
         
-        # Initialize deal finder with extended throttling
-        finder = AmazonDealFinder()
-        finder.min_request_interval = 15.0  # 15 seconds between requests
+        # The process-wide finder's rate limiter paces requests across all
+        # searches and keeps its learned rate between scheduled runs
+        finder = get_finder()
         
         logger.info("Starting daily deal fetch")
         
@@ -57,105 +99,25 @@ def fetch_daily_deals():
             "fruit snacks"
         ]
         
+        sem = asyncio.Semaphore(MAX_SEARCH_WORKERS)
+        searches = [_search_keyword(finder, keyword, sem) for keyword in keywords]
+        
+        # ASINs already stored are dropped before saving; loaded once, alongside the searches
+        recent_asins = asyncio.create_task(asyncio.to_thread(db.get_recent_asins))
+        
+        # Save each keyword's deals as soon as its search finishes, so database
+        # writes overlap the searches still waiting on the API
         deals_found = 0
-        deals_saved = 0
+        saves = []
+        for search in asyncio.as_completed(searches):
+            deals = await search
+            deals_found += len(deals)
+            known = await recent_asins
+            deals = [deal for deal in deals if deal['asin'] not in known]
+            if deals:
+                saves.append(asyncio.create_task(asyncio.to_thread(db.save_deals_bulk, deals)))
         
-        # Search each keyword one at a time with significant delays
-        for keyword in keywords:
-            try:
-                logger.info(f"Searching for '{keyword}'")
-                
-                # Convert min_price from dollars to cents (API expects lowest denomination)
-                min_price_cents = int(5.0 * 100)  # $5 minimum price
-                
-                # Use only parameters that work with your API version
-                # Get deals for this keyword using the parameters we know work
-                # Use the AmazonDealFinder instance directly instead of the find_deals_by_keyword method
-                response = finder._throttled_request(
-                    finder.client.search_items,
-                    keywords=keyword,
-                    item_count=10,
-                    min_price=min_price_cents,
-                    condition=Condition.NEW,
-                    min_saving_percent=15  # 15% minimum discount
-                )
-                
-                if not hasattr(response, 'items') or not response.items:
-                    logger.warning(f"No items found for '{keyword}'")
-                    continue
-                
-                logger.info(f"Found {len(response.items)} items for '{keyword}'")
-                
-                # Process the items to find deals
-                deals = []
-                for item in response.items:
-                    try:
-                        # Check if the item has offers and listings
-                        if not hasattr(item, 'offers') or not item.offers or not hasattr(item.offers, 'listings') or not item.offers.listings:
-                            continue
-                            
-                        listing = item.offers.listings[0]
-                        
-                        # Check if price exists
-                        if not hasattr(listing, 'price') or not hasattr(listing.price, 'amount'):
-                            continue
-                            
-                        current_price = float(listing.price.amount)
-                        
-                        # Check if saving_basis exists for original price
-                        if not hasattr(listing, 'saving_basis') or not hasattr(listing.saving_basis, 'amount'):
-                            continue
-                            
-                        original_price = float(listing.saving_basis.amount)
-                        
-                        # Calculate discount percentage
-                        discount = int((original_price - current_price) / original_price * 100)
-                        
-                        if discount >= 15:  # 15% minimum discount
-                            # Check for item_info and title
-                            title = "Unknown Product"
-                            if hasattr(item, 'item_info') and hasattr(item.item_info, 'title') and hasattr(item.item_info.title, 'display_value'):
-                                title = item.item_info.title.display_value
-                                
-                            # Check for ASIN
-                            asin = getattr(item, 'asin', 'unknown')
-                            
-                            # Check for image URL
-                            image_url = None
-                            if hasattr(item, 'images') and hasattr(item.images, 'primary') and hasattr(item.images.primary, 'medium'):
-                                image_url = getattr(item.images.primary.medium, 'url', None)
-                            
-                            deals.append({
-                                'asin': asin,
-                                'title': title,
-                                'price': current_price,
-                                'original_price': original_price,
-                                'discount_percent': discount,
-                                'url': f"https://www.amazon.com/dp/{asin}?tag={os.getenv('ASSOCIATE_TAG')}",
-                                'image_url': image_url,
-                                'posted': False
-                            })
-                    except Exception as e:
-                        logger.warning(f"Error processing item {getattr(item, 'asin', 'unknown')}: {e}")
-                        continue
-                
-                if deals:
-                    deals_found += len(deals)
-                    
-                    # Save each deal to database
-                    for deal in deals:
-                        if db.save_deal(deal):
-                            deals_saved += 1
-                
-                # Wait 45 seconds between keywords to avoid rate limits
-                logger.info(f"Waiting 45 seconds before next search...")
-                time.sleep(45)
-                
-            except Exception as e:
-                logger.error(f"Error searching for '{keyword}': {e}")
-                # Wait longer after an error
-                logger.info(f"Waiting 3 minutes after error...")
-                time.sleep(180)
+        deals_saved = sum(await asyncio.gather(*saves))
         
         logger.info(f"Deal fetch complete. Found {deals_found} deals, saved {deals_saved} new deals.")
         return True
@@ -164,6 +126,10 @@ def fetch_daily_deals():
         logger.error(f"Error in fetch_daily_deals: {e}")
         return False
 
+def fetch_daily_deals():
+    """Synchronous entry point for fetch_daily_deals_async"""
+    return asyncio.run(fetch_daily_deals_async())
+
 if __name__ == "__main__":
     logger.info("=== Deal Fetcher Started ===")
     success = fetch_daily_deals()
@@ -0,0 +1,73 @@
+"""
+Disk Cache - Small persistent key/value store with per-entry expiry
+Lets consecutive bot runs share API results instead of re-requesting them
+"""
+
+import os
+import logging
+import shelve
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger("GoinUPDeals")
+
+CACHE_PATH = os.getenv("GOINUPDEALS_CACHE_PATH", os.path.expanduser("~/.cache/goinupdeals/cache"))
+
+# shelve does not support concurrent access, so serialize it within the process
+_lock = threading.Lock()
+
+def _open_cache():
+    """Open the cache shelf, creating its directory if needed"""
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    return shelve.open(CACHE_PATH)
+
+def cache_get(key: str, ttl: float) -> Optional[Any]:
+    """
+    Return the cached value for key, or None if missing or older than ttl seconds
+    """
+    try:
+        with _lock, _open_cache() as cache:
+            entry = cache.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > ttl:
+            return None
+        return value
+    except Exception as e:
+        logger.warning(f"Error reading cache entry {key}: {e}")
+        return None
+
+def cache_set(key: str, value: Any) -> None:
+    """Store a picklable value under key"""
+    try:
+        with _lock, _open_cache() as cache:
+            cache[key] = (time.time(), value)
+    except Exception as e:
+        logger.warning(f"Error writing cache entry {key}: {e}")
+
+def cache_delete(key: str) -> None:
+    """Remove a single entry, if present"""
+    try:
+        with _lock, _open_cache() as cache:
+            cache.pop(key, None)
+    except Exception as e:
+        logger.warning(f"Error deleting cache entry {key}: {e}")
+
+def cache_clear(prefix: str = "") -> int:
+    """
+    Remove every entry whose key starts with prefix
+
+    Returns:
+        Number of entries removed
+    """
+    try:
+        with _lock, _open_cache() as cache:
+            keys = [key for key in cache.keys() if key.startswith(prefix)]
+            for key in keys:
+                del cache[key]
+        return len(keys)
+    except Exception as e:
+        logger.warning(f"Error clearing cache: {e}")
+        return 0